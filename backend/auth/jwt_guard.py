@@ -1,21 +1,116 @@
 import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
 from dotenv import load_dotenv
 load_dotenv()
 
 import jwt
 from jwt import PyJWKClient
 from fastapi import Request, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 PROJECT_URL = os.getenv("SUPABASE_URL")
 if not PROJECT_URL:
     raise RuntimeError("SUPABASE_URL is required")
 
+# Optional: enables HS256 project-signed tokens (internal hops). This secret is
+# not part of the JWKS and has to be rotated separately.
+JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+
 JWKS_URL = f"{PROJECT_URL}/auth/v1/.well-known/jwks.json"
 AUD = "authenticated"
-ALGS = ["ES256"]
+ALGS = ["ES256", "HS256"]
+JWKS_LIFESPAN = 3600
+
+logger = logging.getLogger(__name__)
+
+_jwk_client = PyJWKClient(
+    JWKS_URL,
+    cache_keys=True,
+    max_cached_keys=16,
+    cache_jwk_set=True,
+    lifespan=JWKS_LIFESPAN,
+)
+
+_kid_keys: dict = {}
+# kid -> [lock, number of coroutines holding or waiting on it]
+_kid_locks: "dict[str, list]" = {}
 
-_jwk_client = PyJWKClient(JWKS_URL)
+async def _signing_key(kid: str):
+    key = _kid_keys.get(kid)
+    if key is not None:
+        return key
+    # Single-flight: concurrent requests for an unseen kid share one JWKS fetch
+    entry = _kid_locks.get(kid)
+    if entry is None:
+        entry = _kid_locks[kid] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            key = _kid_keys.get(kid)
+            if key is None:
+                key = (await run_in_threadpool(_jwk_client.get_signing_key, kid)).key
+                _kid_keys[kid] = key
+    finally:
+        # Only the last user drops the lock; lock.locked() is False while waiters are still queued
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _kid_locks[kid]
+    return key
+
+async def warm_jwks(refresh: bool = False):
+    """Fetch the JWKS and resolve every signing key ahead of the first request."""
+    signing_keys = await run_in_threadpool(_jwk_client.get_signing_keys, refresh)
+    keys = {jwk.key_id: jwk.key for jwk in signing_keys}
+    # Swap in the fresh set so keys dropped from the JWKS stop verifying
+    _kid_keys.clear()
+    _kid_keys.update(keys)
+
+async def refresh_jwks_loop():
+    """Refetch the JWKS shortly before the cached set expires."""
+    while True:
+        await asyncio.sleep(JWKS_LIFESPAN - 60)
+        try:
+            await warm_jwks(refresh=True)
+        except Exception as e:
+            logger.warning(f"JWKS refresh failed: {str(e)}")
+
+_TOKEN_CACHE_SIZE = 4096
+_token_cache: "OrderedDict[bytes, tuple[float, dict]]" = OrderedDict()
+
+def _cached_payload(key: bytes):
+    entry = _token_cache.get(key)
+    if entry is None:
+        return None
+    exp, payload = entry
+    if exp <= time.time():
+        del _token_cache[key]
+        return None
+    _token_cache.move_to_end(key)
+    return payload
+
+def _cache_payload(key: bytes, payload: dict):
+    # Evict from the LRU end only: over capacity, or already expired
+    now = time.time()
+    while _token_cache and (
+        len(_token_cache) >= _TOKEN_CACHE_SIZE
+        or next(iter(_token_cache.values()))[0] <= now
+    ):
+        _token_cache.popitem(last=False)
+    _token_cache[key] = (payload["exp"], payload)
+
+def _verify(token: str, signing_key, alg: str) -> dict:
+    return jwt.decode(
+        token,
+        signing_key,
+        algorithms=[alg],
+        audience=AUD,
+        options={"require": ["exp", "iat"]},
+    )
 
 class JWTBearer(HTTPBearer):
     async def __call__(self, request: Request):
@@ -23,18 +118,26 @@ class JWTBearer(HTTPBearer):
         if not cred or cred.scheme.lower() != "bearer":
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid auth scheme")
         token = cred.credentials
-        try:
-            signing_key = _jwk_client.get_signing_key_from_jwt(token).key
-            payload = jwt.decode(
-                token,
-                signing_key,
-                algorithms=ALGS,
-                audience=AUD,
-                options={"require": ["exp", "iat"]},
-            )
+        key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        payload = _cached_payload(key)
+        if payload is not None:
             request.state.user = payload
             return token
+        try:
+            header = jwt.get_unverified_header(token)
+            alg = header.get("alg")
+            if alg not in ALGS or (alg == "HS256" and not JWT_SECRET):
+                raise jwt.InvalidAlgorithmError(f"Algorithm not allowed: {alg}")
+            if alg == "HS256":
+                # HMAC verify is cheaper than a threadpool hop, so run it inline
+                payload = _verify(token, JWT_SECRET, alg)
+            else:
+                signing_key = await _signing_key(header.get("kid"))
+                payload = await run_in_threadpool(_verify, token, signing_key, alg)
         except jwt.ExpiredSignatureError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
-        except jwt.InvalidTokenError:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
\ No newline at end of file
+        except (jwt.InvalidTokenError, jwt.PyJWKClientError):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        _cache_payload(key, payload)
+        request.state.user = payload
+        return token
\ No newline at end of file
@@ -1,15 +1,49 @@
+import asyncio
+import logging
+from functools import lru_cache
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI, Depends
 from auth.routes import router as auth_router
-from auth.jwt_guard import JWTBearer
+from auth.jwt_guard import JWTBearer, warm_jwks, refresh_jwks_loop
+from services.db import create_pg_pool, health
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
-app.include_router(auth_router)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # create_pool already opens and checks min_size connections
+    app.state.pg_pool = await create_pg_pool()
+    refresh_task = None
+    try:
+        try:
+            await warm_jwks()
+        except Exception as e:
+            logger.warning(f"JWKS warm-up failed, keys will be fetched on demand: {str(e)}")
+        refresh_task = asyncio.create_task(refresh_jwks_loop())
+        yield
+    finally:
+        if refresh_task is not None:
+            refresh_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await refresh_task
+        await app.state.pg_pool.close()
 
-@app.get("/")
-def root():
-    return{"message": "Hello World"}
+@lru_cache(maxsize=1)
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
 
-@app.get("/protected", dependencies=[Depends(JWTBearer())], tags=["test"])
-def protected():
-    return {"ok": True}
\ No newline at end of file
+    app.include_router(auth_router)
+
+    @app.get("/")
+    def root():
+        return{"message": "Hello World"}
+
+    app.add_api_route("/health", health, methods=["GET"])
+
+    @app.get("/protected", dependencies=[Depends(JWTBearer())], tags=["test"])
+    def protected():
+        return {"ok": True}
+
+    return app
+
+app = create_app()
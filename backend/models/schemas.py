@@ -1,9 +1,14 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+import math
+from pydantic import BaseModel, Field, ConfigDict, computed_field
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 from decimal import Decimal
 
 # User and Auth
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
 class UserResponse(BaseModel):
     id: str #UUID from supabase auth
     email: str
@@ -11,8 +16,7 @@ class UserResponse(BaseModel):
     role: str
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Entity
 class EntityBase(BaseModel):
@@ -27,8 +31,7 @@ class EntityResponse(EntityBase):
     id: int
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class EntityTree(EntityResponse):
     children: List ['EntityTree'] = []
@@ -52,8 +55,7 @@ class BalanceSheetResponse(BalanceSheetBase):
     source_url: str
     status: str # 'pending', 'processing', 'failed'
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class BalanceSheetDetailResponse(BalanceSheetResponse):
     entity_name: str
@@ -76,8 +78,7 @@ class SheetItemResponse(SheetItemBase):
     id: int
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class SheetItemGrouped(BaseModel):
     """Group items by section"""
@@ -85,6 +86,16 @@ class SheetItemGrouped(BaseModel):
     items: List[SheetItemResponse]
     total: Decimal
 
+class SheetItemGroupedFast(BaseModel):
+    """Group item values by section, totalled as float for reporting (Decimal stays authoritative)"""
+    section: str
+    values: List[float]
+
+    @computed_field
+    @property
+    def total(self) -> float:
+        return math.fsum(self.values)
+
 #File Upload
 class BalanceSheetUpload(BaseModel):
     entity_name: str
@@ -101,11 +112,13 @@ class GeminiSubsidiary(BaseModel):
 
 class GeminiLineItem(BaseModel):
     subsidiary: str
-    section: str
+    section: Literal["assets", "liabilities", "equity", "income", "cashflow"]
     line_name: str
     value: float
     currency: Optional[str] = "INR"
 
+    model_config = ConfigDict(from_attributes=True, frozen=True, extra="ignore")
+
 class GeminiParsedData(BaseModel):
     entity: Dict[str, Any]
     subsidiaries: List[GeminiSubsidiary]
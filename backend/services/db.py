@@ -0,0 +1,70 @@
+import os
+import time
+import asyncpg
+from fastapi import Request, Depends
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+load_dotenv()
+
+SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
+if not SUPABASE_DB_URL:
+    raise RuntimeError("SUPABASE_DB_URL is required")
+
+# Health probes within this window reuse the last successful DB ping
+_HEALTH_TTL = 30.0
+_health_cache = {"t": 0.0, "v": None}
+
+
+async def create_pg_pool() -> asyncpg.Pool:
+    """
+    Create the process-wide Postgres pool (direct or via Supavisor).
+
+    Returns:
+        asyncpg connection pool
+    """
+
+    return await asyncpg.create_pool(
+        dsn=SUPABASE_DB_URL,
+        min_size=2,
+        max_size=10,
+        max_inactive_connection_lifetime=1800,
+        # Supavisor transaction mode (port 6543) does not support prepared statements
+        statement_cache_size=0,
+    )
+
+
+def get_pg_pool(request: Request) -> asyncpg.Pool:
+    """FastAPI dependency returning the pool created at startup."""
+    return request.app.state.pg_pool
+
+
+async def check_health(pool: asyncpg.Pool) -> dict:
+    """
+    Ping the database, reusing a successful result for _HEALTH_TTL seconds.
+
+    Failures are not cached and propagate to the caller.
+
+    Args:
+        pool: Pool created at startup
+
+    Returns:
+        Health status dict
+    """
+
+    now = time.monotonic()
+    if _health_cache["v"] and now - _health_cache["t"] < _HEALTH_TTL:
+        return _health_cache["v"]
+
+    async with pool.acquire() as conn:
+        await conn.fetchval("SELECT 1")
+    _health_cache["t"] = now
+    _health_cache["v"] = {"status": "ok"}
+    return _health_cache["v"]
+
+
+async def health(pool: asyncpg.Pool = Depends(get_pg_pool)):
+    """Shared handler for the /health and /auth/health endpoints."""
+    try:
+        return await check_health(pool)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "fail", "error": str(e)})
@@ -1,9 +1,12 @@
+import io
 import os
-import json
+import orjson
 import logging
-from typing import Optional
+from typing import Optional, List
 import google.generativeai as genai
-from models.schemas import GeminiProcessingResult, GeminiParsedData
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter, ValidationError
+from models.schemas import GeminiProcessingResult, GeminiParsedData, GeminiLineItem
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,56 +14,47 @@ logger = logging.getLogger(__name__)
 
 # Configure Gemini API
 genai.configure(api_key=os.getenv("GENAI_API_KEY"))
+# JSON response mode makes Gemini return bare JSON, no markdown fences
+_MODEL = genai.GenerativeModel(
+    'models/gemini-2.5-flash',
+    generation_config={"response_mime_type": "application/json"}
+)
 
+# PDFs at or above this size go through the File API instead of inline bytes
+_INLINE_PDF_LIMIT = 256 * 1024
 
-async def process_balance_sheet_pdf(
-    pdf_bytes: bytes,
-    entity_name: str
-) -> GeminiProcessingResult:
-    """
-    Process a PDF balance sheet using Google Gemini 2.5 Flash.
-    
-    Args:
-        pdf_bytes: Raw PDF file bytes
-        entity_name: Name of the main entity being processed
-    
-    Returns:
-        GeminiProcessingResult with parsed data or error
-    """
-    
-    try:
-        # Initialize Gemini model
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
-        
-        # Craft the prompt for Gemini
-        prompt = """You are a financial data extraction expert. Extract structured financial data from this balance sheet PDF.
+# Validates a whole line_items list in one pydantic-core call
+_LINE_ITEMS_ADAPTER = TypeAdapter(List[GeminiLineItem])
+
+# Prompt for Gemini; only the entity name varies per call
+_PROMPT_TEMPLATE = """You are a financial data extraction expert. Extract structured financial data from this balance sheet PDF.
 
-The main company is: """ + entity_name + """
+The main company is: {entity}
 
 Return ONLY valid JSON (no markdown, no code blocks, no extra text) with this exact structure:
 
-{
-  "entity": {
+{{
+  "entity": {{
     "name": "company_name",
     "fiscal_year": 2024,
     "fiscal_period": "Annual or Q1 or Q2 or Q3 or Q4"
-  },
+  }},
   "subsidiaries": [
-    {
+    {{
       "name": "Subsidiary Name",
       "parent": "Parent Company Name"
-    }
+    }}
   ],
   "line_items": [
-    {
+    {{
       "subsidiary": "Entity Name",
       "section": "assets or liabilities or equity or income or cashflow",
       "line_name": "Line Item Name",
       "value": 1000.50,
       "currency": "INR"
-    }
+    }}
   ]
-}
+}}
 
 EXTRACTION RULES:
 1. Extract ALL line items from Balance Sheet, Income Statement, and Cash Flow
@@ -68,47 +62,84 @@ EXTRACTION RULES:
 3. Include parent company standalone items with subsidiary = main company name
 4. Keep values as numbers only (no currency symbols or commas)
 5. Valid sections: "assets", "liabilities", "equity", "income", "cashflow"
-6. If parent is not explicit, assume parent = """ + entity_name + """
+6. If parent is not explicit, assume parent = {entity}
 
 Return ONLY the JSON object, nothing else."""
+
+
+async def process_balance_sheet_pdf(
+    pdf_bytes: bytes,
+    entity_name: str
+) -> GeminiProcessingResult:
+    """
+    Process a PDF balance sheet using Google Gemini 2.5 Flash.
+    
+    Args:
+        pdf_bytes: Raw PDF file bytes
+        entity_name: Name of the main entity being processed
+    
+    Returns:
+        GeminiProcessingResult with parsed data or error
+    """
+    
+    try:
+        prompt = _PROMPT_TEMPLATE.format_map({"entity": entity_name})
         
         logger.info(f"Sending PDF to Gemini for entity: {entity_name}")
         
-        # Send PDF to Gemini
-        response = model.generate_content([
-            {
+        # Send small PDFs inline; upload larger ones once and reference the handle
+        uploaded_file = None
+        if len(pdf_bytes) < _INLINE_PDF_LIMIT:
+            pdf_part = {
                 "mime_type": "application/pdf",
                 "data": pdf_bytes
-            },
-            prompt
-        ])
+            }
+        else:
+            uploaded_file = await run_in_threadpool(
+                genai.upload_file,
+                io.BytesIO(pdf_bytes),
+                mime_type="application/pdf"
+            )
+            pdf_part = uploaded_file
+        
+        try:
+            response = await _MODEL.generate_content_async([pdf_part, prompt])
+        finally:
+            if uploaded_file is not None:
+                try:
+                    await run_in_threadpool(genai.delete_file, uploaded_file.name)
+                except Exception as e:
+                    logger.warning(f"Could not delete uploaded file {uploaded_file.name}: {str(e)}")
         
         raw_response = response.text
         logger.info(f"Received response from Gemini (length: {len(raw_response)})")
         
-        # Parse the JSON response
-        parsed_json = _extract_json_from_response(raw_response)
-        
-        if not parsed_json:
-            logger.error("Could not extract JSON from Gemini response")
-            return GeminiProcessingResult(
-                success=False,
-                data=None,
-                error="Could not extract valid JSON from Gemini response",
-                raw=raw_response
-            )
-        
-        # Validate the structure
-        validated_data = _validate_parsed_data(parsed_json)
-        
-        if not validated_data:
-            logger.error("Parsed data validation failed")
-            return GeminiProcessingResult(
-                success=False,
-                data=None,
-                error="Parsed data does not match expected structure",
-                raw=raw_response
-            )
+        # Validate the whole response in a single pydantic-core pass
+        try:
+            validated_data = GeminiParsedData.model_validate_json(raw_response)
+        except ValidationError:
+            # Fall back to lenient parsing that drops invalid line items
+            try:
+                parsed_json = orjson.loads(raw_response)
+            except orjson.JSONDecodeError as e:
+                logger.error(f"JSON decode error: {str(e)}")
+                return GeminiProcessingResult(
+                    success=False,
+                    data=None,
+                    error="Could not extract valid JSON from Gemini response",
+                    raw=raw_response
+                )
+            
+            validated_data = _validate_parsed_data(parsed_json)
+            
+            if not validated_data:
+                logger.error("Parsed data validation failed")
+                return GeminiProcessingResult(
+                    success=False,
+                    data=None,
+                    error="Parsed data does not match expected structure",
+                    raw=raw_response
+                )
         
         logger.info(f"Successfully processed PDF: {len(validated_data.line_items)} items extracted")
         
@@ -119,15 +150,6 @@ Return ONLY the JSON object, nothing else."""
             raw=raw_response
         )
     
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON decode error: {str(e)}")
-        return GeminiProcessingResult(
-            success=False,
-            data=None,
-            error=f"JSON parsing error: {str(e)}",
-            raw=None
-        )
-    
     except Exception as e:
         logger.error(f"Unexpected error during processing: {str(e)}")
         return GeminiProcessingResult(
@@ -138,46 +160,6 @@ Return ONLY the JSON object, nothing else."""
         )
 
 
-def _extract_json_from_response(response_text: str) -> Optional[dict]:
-    """
-    Extract JSON from Gemini response (handles markdown code blocks).
-    
-    Args:
-        response_text: Raw text from Gemini
-    
-    Returns:
-        Parsed JSON dict or None
-    """
-    
-    # Remove markdown code blocks if present
-    text = response_text.strip()
-    
-    if text.startswith("```json"):
-        text = text[7:]  # Remove ```json
-    elif text.startswith("```"):
-        text = text[3:]  # Remove ```
-    
-    if text.endswith("```"):
-        text = text[:-3]  # Remove trailing ```
-    
-    text = text.strip()
-    
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        # Try to find JSON object in response
-        start_idx = text.find('{')
-        end_idx = text.rfind('}')
-        
-        if start_idx != -1 and end_idx != -1:
-            try:
-                return json.loads(text[start_idx:end_idx+1])
-            except json.JSONDecodeError:
-                return None
-        
-        return None
-
-
 def _validate_parsed_data(data: dict) -> Optional[GeminiParsedData]:
     """
     Validate and convert parsed JSON to GeminiParsedData model.
@@ -214,12 +196,16 @@ def _validate_parsed_data(data: dict) -> Optional[GeminiParsedData]:
             return None
         
         # Filter out invalid line items
-        valid_line_items = []
-        for item in line_items:
-            if _is_valid_line_item(item):
-                valid_line_items.append(item)
-            else:
-                logger.warning(f"Skipping invalid line item: {item}")
+        try:
+            valid_line_items = _LINE_ITEMS_ADAPTER.validate_python(line_items)
+        except ValidationError as e:
+            invalid_indices = {err["loc"][0] for err in e.errors() if err["loc"]}
+            for idx in sorted(invalid_indices):
+                logger.warning(f"Skipping invalid line item: {line_items[idx]}")
+            valid_line_items = _LINE_ITEMS_ADAPTER.validate_python([
+                item for idx, item in enumerate(line_items)
+                if idx not in invalid_indices
+            ])
         
         if not valid_line_items:
             logger.warning("No valid line items found after filtering")
@@ -236,40 +222,3 @@ def _validate_parsed_data(data: dict) -> Optional[GeminiParsedData]:
     except Exception as e:
         logger.error(f"Validation error: {str(e)}")
         return None
-
-
-def _is_valid_line_item(item: dict) -> bool:
-    """
-    Check if a line item has required fields.
-    
-    Args:
-        item: Line item dictionary
-    
-    Returns:
-        True if valid, False otherwise
-    """
-    
-    required_fields = ["subsidiary", "section", "line_name", "value"]
-    
-    # Check all required fields exist
-    for field in required_fields:
-        if field not in item:
-            logger.warning(f"Line item missing field: {field}")
-            return False
-    
-    # Validate section is one of allowed values
-    valid_sections = ["assets", "liabilities", "equity", "income", "cashflow"]
-    if item.get("section") not in valid_sections:
-        logger.warning(f"Invalid section: {item.get('section')}")
-        return False
-    
-    # Validate value is numeric
-    try:
-        value = item.get("value")
-        if isinstance(value, (int, float)):
-            return True
-        float(value)  # Try to convert to float
-        return True
-    except (ValueError, TypeError):
-        logger.warning(f"Invalid value: {item.get('value')}")
-        return False
\ No newline at end of file